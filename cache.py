@@ -0,0 +1,43 @@
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JsonCache:
+    def __init__(self, directory: Path, ttl_seconds: Optional[float] = None):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            age = time.time() - path.stat().st_mtime
+            if self.ttl_seconds is not None and age > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            return json.loads(path.read_text(encoding="utf-8"))
+
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable cache entry %s: %s", path, e)
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        temp_path = path.with_suffix(".tmp")
+        try:
+            temp_path.write_text(
+                json.dumps(value, ensure_ascii=False), encoding="utf-8"
+            )
+            temp_path.replace(path)
+        except OSError as e:
+            logger.warning("Could not write cache entry %s: %s", path, e)
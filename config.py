@@ -11,6 +11,15 @@ LOG_FILE = BASE_DIR / "myapp.log"
 PROMPT_FILE = BASE_DIR / "prompt.txt"
 YOUTUBE_IDS_FILE = BASE_DIR / "youtube_ids.json"
 OUTPUT_DIR = BASE_DIR / "output_data"
+ENTITY_CACHE_FILE = BASE_DIR / "entity_cache.db"
+CACHE_DIR = BASE_DIR / ".cache"
+GEMINI_CACHE_DIR = CACHE_DIR / "gemini"
+YOUTUBE_CACHE_DIR = CACHE_DIR / "youtube"
+
+MAX_CONCURRENT_VIDEOS = 5
+NOTION_REQUESTS_PER_SECOND = 3
+MAX_CONCURRENT_ENTITY_REQUESTS = 8
+MAX_CONCURRENT_SNIPPET_WRITES = 3
 
 NOTION_API_KEY = os.getenv("NOTION_API_KEY")
 YOUTUBE_API_KEY = os.getenv("GOOGLE_API")
@@ -20,3 +29,15 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MEDIA_DB_ID = os.getenv("MEDIA_DB_ID")
 ENTITIES_DB_ID = os.getenv("ENTITIES_DB_ID")
 SNIPPETS_DB_ID = os.getenv("SNIPPETS_DB_ID")
+
+# Raise to WARNING in production to skip per-video progress messages.
+LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").upper()
+
+REQUIRED_SETTINGS = {
+    "NOTION_API_KEY": NOTION_API_KEY,
+    "GOOGLE_API": YOUTUBE_API_KEY,
+    "GEMINI_API_KEY": GEMINI_API_KEY,
+    "MEDIA_DB_ID": MEDIA_DB_ID,
+    "ENTITIES_DB_ID": ENTITIES_DB_ID,
+    "SNIPPETS_DB_ID": SNIPPETS_DB_ID,
+}
@@ -1,14 +1,25 @@
+import asyncio
+import hashlib
+import io
 import logging
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 from google import genai
+from google.genai import types
 from pydantic import BaseModel, Field
 
 import config
+from cache import JsonCache
 
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL = "gemini-2.5-flash"
+PROMPT_CACHE_TTL = timedelta(hours=1)
+PROMPT_CACHE_REFRESH_MARGIN = timedelta(minutes=5)
+RESPONSE_CACHE_TTL = timedelta(days=30)
+
 
 class EventDate(BaseModel):
     human_readable: Optional[str] = Field(
@@ -35,6 +46,9 @@ class SummaryResponse(BaseModel):
     extracted_snippets: List[ExtractedSnippet]
 
 
+SUMMARY_RESPONSE_SCHEMA = SummaryResponse.model_json_schema()
+
+
 load_dotenv()
 
 
@@ -48,55 +62,143 @@ class GeminiProcessor:
 
         try:
             self.system_instruction = config.PROMPT_FILE.read_text(encoding="utf-8")
-            logger.info(f"Loaded system prompt from {config.PROMPT_FILE}")
+            logger.info("Loaded system prompt from %s", config.PROMPT_FILE)
         except FileNotFoundError:
-            logger.critical(f"Prompt file missing: {config.PROMPT_FILE}")
+            logger.critical("Prompt file missing: %s", config.PROMPT_FILE)
             raise
 
+        self.response_cache = JsonCache(
+            config.GEMINI_CACHE_DIR, ttl_seconds=RESPONSE_CACHE_TTL.total_seconds()
+        )
+        self._prompt_cache: Optional[types.CachedContent] = None
+        self._prompt_cache_enabled = True
+        self._prompt_cache_lock = asyncio.Lock()
+
+    async def _get_prompt_cache_name(self) -> Optional[str]:
+        async with self._prompt_cache_lock:
+            if not self._prompt_cache_enabled:
+                return None
+
+            cache = self._prompt_cache
+            refresh_at = datetime.now(timezone.utc) + PROMPT_CACHE_REFRESH_MARGIN
+            if cache and cache.expire_time and cache.expire_time > refresh_at:
+                return cache.name
+
+            try:
+                self._prompt_cache = await self.client.aio.caches.create(
+                    model=GEMINI_MODEL,
+                    config={
+                        "system_instruction": self.system_instruction,
+                        "ttl": f"{int(PROMPT_CACHE_TTL.total_seconds())}s",
+                    },
+                )
+                logger.info("Created Gemini prompt cache: %s", self._prompt_cache.name)
+                return self._prompt_cache.name
+
+            except genai.errors.APIError as e:
+                # Client errors (prompt below the minimum size, no permission) will
+                # not go away; rate limits and server errors only skip this call.
+                if e.code and 400 <= e.code < 500 and e.code != 429:
+                    logger.warning(
+                        "Gemini prompt caching unavailable, sending prompt inline: %s",
+                        e,
+                    )
+                    self._prompt_cache = None
+                    self._prompt_cache_enabled = False
+                else:
+                    logger.warning(
+                        "Could not create Gemini prompt cache, sending prompt inline "
+                        "for this request: %s",
+                        e,
+                    )
+                return None
+
+    async def _invalidate_prompt_cache(self) -> None:
+        async with self._prompt_cache_lock:
+            self._prompt_cache = None
+
+    async def _generate(
+        self, content_text: str, refresh_stale_cache: bool = True
+    ) -> types.GenerateContentResponse:
+        generation_config: Dict[str, Any] = {
+            "response_mime_type": "application/json",
+            "response_json_schema": SUMMARY_RESPONSE_SCHEMA,
+        }
+
+        cache_name = await self._get_prompt_cache_name()
+        if not cache_name:
+            return await self.client.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=[self.system_instruction, "DATA TO PROCESS:", content_text],
+                config=generation_config,
+            )
+
+        try:
+            return await self.client.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=["DATA TO PROCESS:", content_text],
+                config={**generation_config, "cached_content": cache_name},
+            )
+        except genai.errors.APIError as e:
+            if not refresh_stale_cache or e.code not in (403, 404):
+                raise
+            logger.warning(
+                "Gemini prompt cache %s rejected (%s), recreating.", cache_name, e
+            )
+            await self._invalidate_prompt_cache()
+            return await self._generate(content_text, refresh_stale_cache=False)
+
     def _format_video_content(self, video_data: Dict[str, Any]) -> str:
         title = video_data.get("title", "Unknown Title")
         description = video_data.get("description", "No description provided.")
         transcript_raw = video_data.get("transcript", [])
-        transcript_text = (
-            "\n".join(transcript_raw)
-            if isinstance(transcript_raw, list)
-            else str(transcript_raw)
-        )
 
-        return (
-            f"VIDEO TITLE: {title}\n\n"
-            f"VIDEO DESCRIPTION & SOURCES:\n{description}\n\n"
-            f"TRANSCRIPT CONTENT:\n{transcript_text}"
-        )
-
-    def summarize_video(self, video_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        buffer = io.StringIO()
+        buffer.write(f"VIDEO TITLE: {title}\n\n")
+        buffer.write(f"VIDEO DESCRIPTION & SOURCES:\n{description}\n\n")
+        buffer.write("TRANSCRIPT CONTENT:\n")
+        if isinstance(transcript_raw, list):
+            buffer.writelines(f"{line}\n" for line in transcript_raw)
+        else:
+            buffer.write(str(transcript_raw))
+        return buffer.getvalue()
+
+    def _response_cache_key(self, content_text: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (GEMINI_MODEL, self.system_instruction, content_text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def summarize_video(
+        self, video_data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
         logger.info("Starting Gemini summarization process.")
 
         try:
             full_content_text = self._format_video_content(video_data)
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    self.system_instruction,
-                    "DATA TO PROCESS:",
-                    full_content_text,
-                ],
-                config={
-                    "response_mime_type": "application/json",
-                    "response_json_schema": SummaryResponse.model_json_schema(),
-                },
-            )
+            cache_key = self._response_cache_key(full_content_text)
+            # Cache reads and writes touch the disk; keep them off the event loop.
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                logger.info("Using cached Gemini response %s.", cache_key)
+                return cached
+
+            response = await self._generate(full_content_text)
             logger.info("Received response from Gemini API.")
             structured_data = SummaryResponse.model_validate_json(response.text)
             logger.info("Gemini response validated against Pydantic schema.")
-            return structured_data.model_dump()
+
+            result = structured_data.model_dump()
+            await asyncio.to_thread(self.response_cache.set, cache_key, result)
+            return result
 
         except genai.errors.APIError as e:
-            logger.error(f"Gemini API Error: {e}", exc_info=True)
+            logger.error("Gemini API Error: %s", e, exc_info=True)
             return None
 
         except Exception as e:
             logger.error(
-                f"Error validating or processing Gemini response: {e}", exc_info=True
+                "Error validating or processing Gemini response: %s", e, exc_info=True
             )
             return None
@@ -0,0 +1,35 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+import config
+
+
+def setup_logging() -> logging.Logger:
+    logger = logging.getLogger()
+    # getLevelName maps known names to their number (works on Python 3.10).
+    level = logging.getLevelName(config.LOG_LEVEL)
+    valid_level = isinstance(level, int)
+    logger.setLevel(level if valid_level else logging.INFO)
+
+    formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
+
+    file_handler = logging.FileHandler(config.LOG_FILE)
+    file_handler.setFormatter(formatter)
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+
+    # File and console writes happen on the listener thread, not the event loop.
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, console_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    if not valid_level:
+        logger.warning("Unknown LOG_LEVEL %r; falling back to INFO.", config.LOG_LEVEL)
+
+    return logger
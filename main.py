@@ -1,41 +1,49 @@
+import argparse
+import asyncio
 import json
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 import config
 from gemini import GeminiProcessor
+from logging_config import setup_logging
 from notion import NotionIngester
 from youtube import YoutubeExtractor
 
 
-def setup_logging() -> logging.Logger:
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-
-    formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
-
-    file_handler = logging.FileHandler(config.LOG_FILE)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    return logger
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Notion Knowledge Hub Pipeline")
+    parser.add_argument(
+        "--refresh-cache",
+        "--refresh-entities",
+        dest="refresh_cache",
+        action="store_true",
+        help="Discard the persistent entity cache and re-resolve entities in Notion.",
+    )
+    parser.add_argument(
+        "--no-youtube-cache",
+        dest="no_youtube_cache",
+        action="store_true",
+        help="Refetch YouTube metadata and transcripts, bypassing the disk cache.",
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Indent the JSON backups written to the output directory.",
+    )
+    return parser.parse_args()
 
 
 def validate_config(logger: logging.Logger):
-    missing_keys = []
-    if not config.NOTION_API_KEY:
-        missing_keys.append("NOTION_API_KEY")
-    if not config.YOUTUBE_API_KEY:
-        missing_keys.append("GOOGLE_API")
-    if not config.GEMINI_API_KEY:
-        missing_keys.append("GEMINI_API_KEY")
+    missing_keys = [
+        name for name, value in config.REQUIRED_SETTINGS.items() if not value
+    ]
 
     if missing_keys:
-        logger.critical(f"Missing environment variables: {', '.join(missing_keys)}")
+        logger.critical("Missing environment variables: %s", ", ".join(missing_keys))
         logger.critical("Please check your .env file.")
         sys.exit(1)
 
@@ -50,43 +58,113 @@ def load_youtube_ids(file_path):
     if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
         raise ValueError(f"File {file_path} must contain a JSON list of strings.")
 
-    return ids
+    return list(dict.fromkeys(ids))
+
+
+class BackupWriter:
+    def __init__(self, output_dir: Path, pretty: bool = False):
+        self.output_dir = output_dir
+        self.indent = 4 if pretty else None
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.pending: List[asyncio.Future] = []
+        self.output_dir.mkdir(parents=True, exist_ok=True)
 
+    def _write(self, path: Path, data: Dict[str, Any]) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=self.indent, ensure_ascii=False)
 
-def process_single_video(
+    def submit(self, video_id: str, data: Dict[str, Any]) -> None:
+        path = self.output_dir / f"{video_id}-full.json"
+        loop = asyncio.get_running_loop()
+        self.pending.append(
+            loop.run_in_executor(self.executor, self._write, path, data)
+        )
+
+    async def wait(self, logger: logging.Logger) -> None:
+        results = await asyncio.gather(*self.pending, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Failed to write backup: %s", result)
+        self.executor.shutdown()
+
+
+async def process_single_video(
     video_id: str,
     youtube: YoutubeExtractor,
     gemini: GeminiProcessor,
     notion: NotionIngester,
+    backups: BackupWriter,
     logger: logging.Logger,
+    metadata: Optional[Dict[str, Any]] = None,
+    no_cache: bool = False,
 ):
     try:
-        logger.info(f"--- Processing: {video_id} ---")
+        logger.info("--- Processing: %s ---", video_id)
 
-        youtube_data = youtube.extract_data(video_id)
+        loop = asyncio.get_running_loop()
+        youtube_data = await loop.run_in_executor(
+            None, youtube.extract_data, video_id, metadata, no_cache
+        )
         if not youtube_data:
-            logger.warning(f"Skipping {video_id}: Extraction failed")
+            logger.warning("Skipping %s: Extraction failed", video_id)
             return
 
-        gemini_data = gemini.summarize_video(youtube_data)
+        gemini_data = await gemini.summarize_video(youtube_data)
         if not gemini_data:
-            logger.warning(f"Skipping {video_id}: Summarization failed")
+            logger.warning("Skipping %s: Summarization failed", video_id)
             return
 
         full_data = {**youtube_data, **gemini_data}
 
-        config.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        backup_path = config.OUTPUT_DIR / f"{video_id}-full.json"
-        with open(backup_path, "w", encoding="utf-8") as f:
-            json.dump(full_data, f, indent=4, ensure_ascii=False)
-
-        notion.create_media(full_data)
+        backups.submit(video_id, full_data)
+        await notion.create_media(full_data)
 
     except Exception as e:
-        logger.error(f"Error processing {video_id}: {e}", exc_info=True)
+        logger.error("Error processing %s: %s", video_id, e, exc_info=True)
+
+
+async def process_batch(
+    youtube_ids: List[str],
+    youtube: YoutubeExtractor,
+    gemini: GeminiProcessor,
+    notion: NotionIngester,
+    logger: logging.Logger,
+    pretty: bool = False,
+    no_youtube_cache: bool = False,
+):
+    semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_VIDEOS)
+    backups = BackupWriter(config.OUTPUT_DIR, pretty=pretty)
+    loop = asyncio.get_running_loop()
+
+    async def process_bounded(video_id: str):
+        async with semaphore:
+            await process_single_video(
+                video_id,
+                youtube,
+                gemini,
+                notion,
+                backups,
+                logger,
+                # Only videos whose batch request failed fall back to a single lookup.
+                metadata=metadata.get(video_id),
+                no_cache=no_youtube_cache,
+            )
+
+    async with notion:
+        try:
+            metadata = await loop.run_in_executor(
+                None, youtube.get_metadata_batch, youtube_ids, no_youtube_cache
+            )
+            await asyncio.gather(
+                *[process_bounded(video_id) for video_id in youtube_ids]
+            )
+        finally:
+            await backups.wait(logger)
+            youtube.close()
 
 
 def main():
+    args = parse_args()
     logger = setup_logging()
     logger.info("Starting Notion Knowledge Hub Batch Workflow")
 
@@ -95,18 +173,25 @@ def main():
     try:
         youtube_extractor = YoutubeExtractor(api_key=config.YOUTUBE_API_KEY)
         gemini_processor = GeminiProcessor()
-        notion_ingester = NotionIngester()
+        notion_ingester = NotionIngester(refresh_cache=args.refresh_cache)
 
         youtube_ids = load_youtube_ids(config.YOUTUBE_IDS_FILE)
-        logger.info(f"Loaded {len(youtube_ids)} videos to process.")
-
-        for video_id in youtube_ids:
-            process_single_video(
-                video_id, youtube_extractor, gemini_processor, notion_ingester, logger
+        logger.info("Loaded %d videos to process.", len(youtube_ids))
+
+        asyncio.run(
+            process_batch(
+                youtube_ids,
+                youtube_extractor,
+                gemini_processor,
+                notion_ingester,
+                logger,
+                pretty=args.pretty,
+                no_youtube_cache=args.no_youtube_cache,
             )
+        )
 
     except Exception as e:
-        logger.critical(f"Fatal Error: {e}", exc_info=True)
+        logger.critical("Fatal Error: %s", e, exc_info=True)
         sys.exit(1)
 
     logger.info("Batch workflow finished.")
@@ -1,100 +1,389 @@
-import functools
+import asyncio
 import logging
-from datetime import datetime
-from typing import Any, Dict, List, Optional
-
-from notion_client import Client
-from notion_client.errors import APIResponseError
+import random
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from datetime import date, datetime, timezone
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+)
+
+import httpx
+import orjson
+from notion_client import AsyncClient
+from notion_client.errors import (
+    APIResponseError,
+    HTTPResponseError,
+    RequestTimeoutError,
+)
 
 import config
 
 logger = logging.getLogger(__name__)
 
+MAX_CHILDREN_PER_REQUEST = 100
+ENTITY_QUERY_BATCH_SIZE = 50
+TEXT_CHUNK_SIZE = 1900
+SNIPPET_STATIC_PROPERTIES = {
+    "Note Type": {"select": {"name": "Automated Note"}},
+    "Status": {"select": {"name": "Inbox"}},
+}
+SNIPPET_DATE_COLUMNS = (("date_start_iso", "Start Date"), ("date_end_iso", "End Date"))
+ISO_DATE_PATTERN = re.compile(r"[0-9]{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])")
+HTTP_TIMEOUT_MS = 30_000
+HTTP_LIMITS = httpx.Limits(
+    max_connections=32, max_keepalive_connections=32, keepalive_expiry=60
+)
+# A 429 is rejected before any work, so every call may retry it. A 5xx or a
+# timeout can arrive after Notion committed a write, so those are only retried
+# for idempotent (read-only) calls to avoid duplicate pages or blocks.
+RATE_LIMITED_STATUS = 429
+SERVER_ERROR_STATUSES = {500, 502, 503, 504}
+MAX_ATTEMPTS = 7
+BACKOFF_INITIAL_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+
+class AsyncRateLimiter:
+    def __init__(self, rate: float, period: float = 1.0):
+        self.capacity = rate
+        self.tokens = rate
+        self.fill_rate = rate / period
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                elapsed = now - self.updated_at
+                self.tokens = min(self.capacity, self.tokens + elapsed * self.fill_rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.fill_rate)
+
+
+class OrjsonAsyncClient(httpx.AsyncClient):
+    def build_request(self, method, url, *, json=None, headers=None, **kwargs):
+        if json is not None:
+            headers = httpx.Headers(headers)
+            headers["Content-Type"] = "application/json"
+            kwargs["content"] = orjson.dumps(json)
+        return super().build_request(method, url, headers=headers, **kwargs)
+
 
 class NotionIngester:
-    def __init__(self):
+    def __init__(self, refresh_cache: bool = False):
         if not config.NOTION_API_KEY:
             raise ValueError("NOTION_API_KEY is required.")
 
-        self.client = Client(auth=config.NOTION_API_KEY)
+        self._http_client = OrjsonAsyncClient(limits=HTTP_LIMITS)
+        self.client = AsyncClient(
+            auth=config.NOTION_API_KEY,
+            client=self._http_client,
+            timeout_ms=HTTP_TIMEOUT_MS,
+        )
 
         self.entities_db = config.ENTITIES_DB_ID
         self.media_db = config.MEDIA_DB_ID
         self.snippet_db = config.SNIPPETS_DB_ID
+        self._entity_parent = {
+            "type": "data_source_id",
+            "data_source_id": self.entities_db,
+        }
+        self._media_parent = {"type": "data_source_id", "data_source_id": self.media_db}
+        self._snippet_parent = {
+            "type": "data_source_id",
+            "data_source_id": self.snippet_db,
+        }
 
-    def _get_today_iso(self) -> str:
-        return datetime.now().strftime("%Y-%m-%d")
-
-    def _prepare_markdown_blocks(self, text: str) -> List[Dict[str, Any]]:
-        chunk_size = 1900
-        chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self._entity_cache: Dict[str, Optional[str]] = {}
+        self._entity_locks: DefaultDict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._limiter = AsyncRateLimiter(config.NOTION_REQUESTS_PER_SECOND)
+        self._entity_sem = asyncio.Semaphore(config.MAX_CONCURRENT_ENTITY_REQUESTS)
+        self._write_sem = asyncio.Semaphore(config.MAX_CONCURRENT_SNIPPET_WRITES)
+        self._entity_db = self._open_entity_cache(refresh_cache)
+
+    async def _call(
+        self,
+        method: Callable[..., Awaitable[Any]],
+        *,
+        idempotent: bool = False,
+        **kwargs: Any,
+    ) -> Any:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                await self._limiter.acquire()
+                return await method(**kwargs)
+            except (HTTPResponseError, RequestTimeoutError) as e:
+                status = getattr(e, "status", None)
+                retryable = status == RATE_LIMITED_STATUS or (
+                    idempotent and (status is None or status in SERVER_ERROR_STATUSES)
+                )
+                if not retryable or attempt == MAX_ATTEMPTS:
+                    raise
 
-        return [
-            {
-                "object": "block",
-                "type": "code",
-                "code": {
-                    "rich_text": [{"type": "text", "text": {"content": chunk}}],
-                    "language": "markdown",
-                },
+                delay = self._retry_delay(e, attempt)
+                logger.warning(
+                    "Notion request failed (%s), retrying in %.1fs [%d/%d]",
+                    status or "timeout",
+                    delay,
+                    attempt,
+                    MAX_ATTEMPTS,
+                )
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        headers = getattr(error, "headers", None)
+        retry_after = headers.get("Retry-After") if headers else None
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+        backoff = BACKOFF_INITIAL_SECONDS * 2 ** (attempt - 1)
+        return min(BACKOFF_MAX_SECONDS, backoff) + random.uniform(
+            0, BACKOFF_INITIAL_SECONDS
+        )
+
+    async def aclose(self) -> None:
+        await self._http_client.aclose()
+        self._entity_db.close()
+
+    async def __aenter__(self) -> "NotionIngester":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def _open_entity_cache(self, refresh: bool) -> sqlite3.Connection:
+        connection = sqlite3.connect(config.ENTITY_CACHE_FILE)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entities ("
+            "data_source_id TEXT NOT NULL, name TEXT NOT NULL, "
+            "notion_id TEXT NOT NULL, created_at TEXT NOT NULL, "
+            "PRIMARY KEY (data_source_id, name))"
+        )
+        if refresh:
+            connection.execute(
+                "DELETE FROM entities WHERE data_source_id = ?", (self.entities_db,)
+            )
+            logger.info("Cleared persistent entity cache.")
+        connection.commit()
+        return connection
+
+    def _get_cached_entity(self, key: str) -> Optional[str]:
+        row = self._entity_db.execute(
+            "SELECT notion_id FROM entities WHERE data_source_id = ? AND name = ?",
+            (self.entities_db, key),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _cache_entity(self, key: str, entity_id: str) -> None:
+        self._entity_db.execute(
+            "INSERT OR REPLACE INTO entities "
+            "(data_source_id, name, notion_id, created_at) VALUES (?, ?, ?, ?)",
+            (self.entities_db, key, entity_id, datetime.now().isoformat()),
+        )
+        self._entity_db.commit()
+
+    def _iter_text_blocks(
+        self, text: str, block_type: str, language: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        for i in range(0, len(text), TEXT_CHUNK_SIZE):
+            content: Dict[str, Any] = {
+                "rich_text": [
+                    {"type": "text", "text": {"content": text[i : i + TEXT_CHUNK_SIZE]}}
+                ]
             }
-            for chunk in chunks
-        ]
+            if language:
+                content["language"] = language
+            yield {"object": "block", "type": block_type, block_type: content}
 
-    @functools.cache
-    def get_or_create_entity(self, name: str) -> Optional[str]:
+    async def get_or_create_entity(self, name: str) -> Optional[str]:
         name = name.strip()
         if not name:
             return None
 
-        logger.info(f"Resolving entity: {name}")
+        entity_ids = await self._resolve_entities([name])
+        return entity_ids.get(name.casefold())
+
+    def _entity_keys(self, page: Dict[str, Any]) -> Set[str]:
+        properties = page.get("properties", {})
+        title = "".join(
+            part.get("plain_text", "")
+            for part in properties.get("Name", {}).get("title", [])
+        )
+        aliases = [
+            option.get("name", "")
+            for option in properties.get("Aliases", {}).get("multi_select", [])
+        ]
+        return {text.strip().casefold() for text in [title, *aliases] if text.strip()}
+
+    async def _query_entities(self, names: List[str]) -> Optional[Dict[str, str]]:
+        logger.info("Resolving %s entities in Notion", len(names))
+        wanted = {name.casefold() for name in names}
+        found: Dict[str, str] = {}
 
         try:
-            response = self.client.data_sources.query(
-                **{
+            for i in range(0, len(names), ENTITY_QUERY_BATCH_SIZE):
+                batch = names[i : i + ENTITY_QUERY_BATCH_SIZE]
+                conditions = [
+                    {"property": "Aliases", "multi_select": {"contains": name}}
+                    for name in batch
+                ] + [{"property": "Name", "title": {"equals": name}} for name in batch]
+
+                query: Dict[str, Any] = {
                     "data_source_id": self.entities_db,
-                    "filter": {
-                        "or": [
-                            {"property": "Aliases", "multi_select": {"contains": name}},
-                            {"property": "Name", "title": {"equals": name}},
-                        ]
-                    },
+                    "filter": {"or": conditions},
+                    "page_size": 100,
                 }
-            )
+                while True:
+                    response = await self._call(
+                        self.client.data_sources.query, idempotent=True, **query
+                    )
+                    for page in response["results"]:
+                        for key in self._entity_keys(page) & wanted:
+                            found.setdefault(key, page["id"])
 
-            if response["results"]:
-                entity_id = response["results"][0]["id"]
-                logger.info("Found existing entity ID: %s", entity_id)
-                return entity_id
+                    if not response.get("has_more"):
+                        break
+                    query["start_cursor"] = response["next_cursor"]
 
-            logger.info("Entity not found. creating: %s", name)
+        except Exception as e:
+            logger.error("Error querying entities %s: %s", names, e)
+            return None
 
-            new_page = self.client.pages.create(
-                **{
-                    "parent": {
-                        "type": "data_source_id",
-                        "data_source_id": self.entities_db,
-                    },
-                    "properties": {
-                        "Name": {"title": [{"text": {"content": name}}]},
-                        "Status": {"select": {"name": "Inbox"}},
+        logger.info("Found %s of %s entities in Notion", len(found), len(names))
+        return found
+
+    async def _create_entity(self, name: str) -> Optional[str]:
+        logger.info("Entity not found. creating: %s", name)
+
+        try:
+            async with self._entity_sem:
+                new_page = await self._call(
+                    self.client.pages.create,
+                    **{
+                        "parent": self._entity_parent,
+                        "properties": {
+                            "Name": {"title": [{"text": {"content": name}}]},
+                            "Status": {"select": {"name": "Inbox"}},
+                        },
                     },
-                }
-            )
+                )
 
             entity_id = new_page["id"]
             logger.info("CREATED ENTITY: %s | ID: %s", name, entity_id)
             return entity_id
 
         except Exception as e:
-            logger.error(f"Error resolving entity '{name}': {e}")
+            logger.error("Error creating entity '%s': %s", name, e)
             return None
 
-    def create_media(self, data: Dict[str, Any]) -> Optional[str]:
-        logger.info(f"Creating Media page: {data.get('title')}")
+    async def _append_children(
+        self, block_id: str, blocks: Iterable[Dict[str, Any]]
+    ) -> None:
+        # Appends to one page stay sequential so the blocks keep their order.
+        blocks = iter(blocks)
+        while batch := list(islice(blocks, MAX_CHILDREN_PER_REQUEST)):
+            try:
+                await self._call(
+                    self.client.blocks.children.append,
+                    block_id=block_id,
+                    children=batch,
+                )
+            except Exception as e:
+                logger.error("Failed to append blocks to %s: %s", block_id, e)
+                return
+
+    async def _resolve_entities(self, names: List[str]) -> Dict[str, Optional[str]]:
+        unique_names: Dict[str, str] = {}
+        for raw_name in names:
+            name = raw_name.strip()
+            key = name.casefold()
+            if key and key not in unique_names:
+                unique_names[key] = name
+
+        pending: Dict[str, str] = {}
+        for key, name in unique_names.items():
+            if key in self._entity_cache:
+                continue
+            entity_id = self._get_cached_entity(key)
+            if entity_id:
+                self._entity_cache[key] = entity_id
+            else:
+                pending[key] = name
+
+        if pending:
+            # Concurrent videos often share entities; hold each name's lock so only
+            # the first caller creates it. Sorted order keeps acquisition deadlock-free.
+            async with AsyncExitStack() as stack:
+                for key in sorted(pending):
+                    await stack.enter_async_context(self._entity_locks[key])
+
+                pending = {
+                    key: name
+                    for key, name in pending.items()
+                    if key not in self._entity_cache
+                }
+                await self._lookup_or_create_entities(pending)
+
+        return {key: self._entity_cache.get(key) for key in unique_names}
+
+    async def _lookup_or_create_entities(self, pending: Dict[str, str]) -> None:
+        if not pending:
+            return
+
+        found = await self._query_entities(list(pending.values()))
+        if found is None:
+            return
+
+        missing = {key: name for key, name in pending.items() if key not in found}
+        created = await asyncio.gather(
+            *[self._create_entity(name) for name in missing.values()]
+        )
+
+        resolved = {**found, **dict(zip(missing, created, strict=True))}
+        for key, entity_id in resolved.items():
+            if entity_id:
+                self._cache_entity(key, entity_id)
+            self._entity_cache[key] = entity_id
+
+    async def create_media(self, data: Dict[str, Any]) -> Optional[str]:
+        logger.info("Creating Media page: %s", data.get("title"))
         entity_name = data["channelTitle"].strip()
+        snippets = data.get("extracted_snippets", [])
 
-        entity_id = self.get_or_create_entity(entity_name)
+        entity_ids = await self._resolve_entities(
+            [entity_name]
+            + [name for snippet in snippets for name in snippet.get("entities", [])]
+        )
+        entity_id = entity_ids.get(entity_name.casefold())
 
         if not entity_id:
             logger.error(
@@ -102,81 +391,88 @@ class NotionIngester:
             )
             return None
 
+        today_iso = date.today().isoformat()
+        summary_blocks = self._iter_text_blocks(
+            data["full_summary"], "code", language="markdown"
+        )
+
         try:
-            response = self.client.pages.create(
+            response = await self._call(
+                self.client.pages.create,
                 **{
-                    "parent": {
-                        "type": "data_source_id",
-                        "data_source_id": self.media_db,
-                    },
+                    "parent": self._media_parent,
                     "properties": {
                         "Title": {"title": [{"text": {"content": data["title"]}}]},
                         "Media Type": {"select": {"name": "Video"}},
                         "Author/Creator": {"relation": [{"id": entity_id}]},
                         "URL": {"url": data["url"]},
                         "Publishing Date": {"date": {"start": data["publishedAt"]}},
-                        "Adding Date": {"date": {"start": self._get_today_iso()}},
+                        "Adding Date": {"date": {"start": today_iso}},
                         "Status": {"select": {"name": "Inbox"}},
                     },
-                    # Note: verify _prepare_markdown_blocks is named correctly in your class
-                    # (In your provided file it was named _prepare_markdown_blocks, but called as prepare_summary_blocks?
-                    #  I will assume you use the name defined in this file: _prepare_markdown_blocks)
-                    "children": self._prepare_markdown_blocks(data["full_summary"]),
-                }
+                    "children": list(islice(summary_blocks, MAX_CHILDREN_PER_REQUEST)),
+                },
             )
             media_page_id = response["id"]
             logger.info("CREATED MEDIA: %s | ID: %s", data["title"], media_page_id)
 
-            snippets = data.get("extracted_snippets", [])
-            logger.info(f"Processing {len(snippets)} snippets...")
-
-            for snippet in reversed(snippets):
-                self._create_snippet(snippet, media_page_id)
+            logger.info("Processing %s snippets...", len(snippets))
+
+            # Snippets only need the media page ID, so the rest of the summary
+            # body is appended while they are created; both share the limiter.
+            # Snippets are issued newest-first so Notion's created-time order
+            # matches the transcript; the write semaphore grants slots FIFO.
+            body_result, *results = await asyncio.gather(
+                self._append_children(media_page_id, summary_blocks),
+                *[
+                    self._create_snippet(snippet, media_page_id, entity_ids, today_iso)
+                    for snippet in reversed(snippets)
+                ],
+                return_exceptions=True,
+            )
+            if isinstance(body_result, Exception):
+                logger.error(
+                    "Failed to append media body: %s", body_result, exc_info=body_result
+                )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(
+                        "Failed to create snippet: %s", result, exc_info=result
+                    )
 
             return media_page_id
 
         except Exception as e:
-            logger.error(f"Failed to create media page: {e}", exc_info=True)
+            logger.error("Failed to create media page: %s", e, exc_info=True)
             return None
 
-    def _create_snippet(self, snippet: Dict[str, Any], media_id: str) -> None:
-        entities = []
-        for entity_name in snippet.get("entities", []):
-            linked_entity = self.get_or_create_entity(entity_name)
-            if linked_entity:
-                entities.append({"id": linked_entity})
+    async def _create_snippet(
+        self,
+        snippet: Dict[str, Any],
+        media_id: str,
+        entity_ids: Dict[str, Optional[str]],
+        today_iso: str,
+    ) -> Optional[Dict[str, Any]]:
+        linked_ids = dict.fromkeys(
+            entity_ids.get(name.strip().casefold())
+            for name in snippet.get("entities", [])
+        )
+        entities = [{"id": entity_id} for entity_id in linked_ids if entity_id]
 
         full_context = snippet["context"]
         title_content = full_context
         children_blocks = []
 
-        if len(full_context) > 1900:
-            title_content = full_context[:1900] + "... (truncated, see body)"
-
-            chunk_size = 1900
-            text_chunks = [
-                full_context[i : i + chunk_size]
-                for i in range(0, len(full_context), chunk_size)
-            ]
-
-            for chunk in text_chunks:
-                children_blocks.append(
-                    {
-                        "object": "block",
-                        "type": "paragraph",
-                        "paragraph": {
-                            "rich_text": [{"type": "text", "text": {"content": chunk}}]
-                        },
-                    }
-                )
+        if len(full_context) > TEXT_CHUNK_SIZE:
+            title_content = full_context[:TEXT_CHUNK_SIZE] + "... (truncated, see body)"
+            children_blocks = list(self._iter_text_blocks(full_context, "paragraph"))
 
         properties = {
+            **SNIPPET_STATIC_PROPERTIES,
             "Context": {"title": [{"text": {"content": title_content}}]},
             "Source": {"relation": [{"id": media_id}]},
             "Entities": {"relation": entities},
-            "Note Type": {"select": {"name": "Automated Note"}},
-            "Status": {"select": {"name": "Inbox"}},
-            "Adding Date": {"date": {"start": self._get_today_iso()}},
+            "Adding Date": {"date": {"start": today_iso}},
         }
 
         event_data = snippet.get("event_date", {})
@@ -185,45 +481,66 @@ class NotionIngester:
                 "rich_text": [{"text": {"content": event_data["human_readable"]}}]
             }
 
-        date_mapping = [("date_start_iso", "Start Date"), ("date_end_iso", "End Date")]
-
-        for json_key, notion_column in date_mapping:
+        for json_key, notion_column in SNIPPET_DATE_COLUMNS:
             val = event_data.get(json_key)
 
             if val and isinstance(val, str) and val.lower() != "null":
-                try:
-                    datetime.strptime(val, "%Y-%m-%d")
+                if self._is_iso_date(val):
                     properties[notion_column] = {"date": {"start": val}}
-                except ValueError:
+                else:
                     logger.warning(
-                        f"Skipping {notion_column}: Invalid format '{val}' in snippet."
+                        "Skipping %s: Invalid format '%s' in snippet.",
+                        notion_column,
+                        val,
                     )
 
         create_kwargs = {
-            "parent": {"data_source_id": self.snippet_db, "type": "data_source_id"},
+            "parent": self._snippet_parent,
             "properties": properties,
         }
 
         if children_blocks:
-            create_kwargs["children"] = children_blocks
+            create_kwargs["children"] = children_blocks[:MAX_CHILDREN_PER_REQUEST]
+
+        async with self._write_sem:
+            page = await self._submit_snippet(create_kwargs)
 
+        if page:
+            await self._append_children(
+                page["id"], children_blocks[MAX_CHILDREN_PER_REQUEST:]
+            )
+        return page
+
+    @staticmethod
+    def _is_iso_date(value: str) -> bool:
+        # The regex cheaply rejects most bad values; fromisoformat then rejects
+        # impossible days such as 2020-02-31 before Notion answers with a 400.
+        if not ISO_DATE_PATTERN.fullmatch(value):
+            return False
         try:
-            return self.client.pages.create(**create_kwargs)
+            date.fromisoformat(value)
+        except ValueError:
+            return False
+        return True
+
+    async def _submit_snippet(
+        self, create_kwargs: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        try:
+            return await self._call(self.client.pages.create, **create_kwargs)
 
         except APIResponseError as e:
             if e.status == 400:
-                logger.warning(
-                    f"400 Error detected ({e.message}). Retrying without dates."
-                )
+                logger.warning("400 Error detected (%s). Retrying without dates.", e)
+                properties = create_kwargs["properties"]
                 properties.pop("Start Date", None)
                 properties.pop("End Date", None)
-                create_kwargs["properties"] = properties
 
                 try:
-                    return self.client.pages.create(**create_kwargs)
+                    return await self._call(self.client.pages.create, **create_kwargs)
                 except Exception as retry_e:
-                    logger.error(f"Retry failed: {retry_e}")
+                    logger.error("Retry failed: %s", retry_e)
                     return None
 
-            logger.error(f"Failed to create snippet: {e}")
+            logger.error("Failed to create snippet: %s", e)
             return None
@@ -1,71 +1,186 @@
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import cached_property
+from itertools import chain
 
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from requests import Session
 from youtube_transcript_api import (
     NoTranscriptFound,
     TranscriptsDisabled,
     YouTubeTranscriptApi,
 )
-from youtube_transcript_api.formatters import TextFormatter
+
+import config
+from cache import JsonCache
 
 logger = logging.getLogger(__name__)
 
+# videos.list accepts at most 50 comma-separated IDs per call.
+METADATA_BATCH_SIZE = 50
+METADATA_KEYS = ["title", "publishedAt", "description", "channelTitle"]
+# Only the snippet part is read; the id is kept to map batched items back.
+METADATA_FIELDS = f"items(id,snippet({','.join(METADATA_KEYS)}))"
+METADATA_CACHE_TTL = timedelta(days=7)
+
 
 class YoutubeExtractor:
     def __init__(self, api_key):
         if not api_key:
             logger.error("API Key is missing for YouTubeExtractor initialization.")
             raise ValueError("API Key is required to initialize YouTubeExtractor")
-        self.youtube_client = build("youtube", "v3", developerKey=api_key)
-        self.formatter = TextFormatter()
-        self.transcript_client = YouTubeTranscriptApi()
+        self._api_key = api_key
+        self._thread_local = threading.local()
+        self._transcript_sessions = []
+        self._transcript_sessions_lock = threading.Lock()
+        self.metadata_cache = JsonCache(
+            config.YOUTUBE_CACHE_DIR / "metadata",
+            ttl_seconds=METADATA_CACHE_TTL.total_seconds(),
+        )
+        # Published transcripts rarely change, so they are kept until deleted.
+        self.transcript_cache = JsonCache(config.YOUTUBE_CACHE_DIR / "transcripts")
         logger.info("YoutubeExtractor initialized.")
 
-    def _get_metadata(self, youtube_id):
-        try:
-            response = (
-                self.youtube_client.videos()
-                .list(part="snippet,contentDetails,topicDetails", id=youtube_id)
-                .execute()
+    @cached_property
+    def youtube_client(self):
+        # Built on first metadata request; fully cached runs never need it.
+        return build(
+            "youtube",
+            "v3",
+            developerKey=self._api_key,
+            static_discovery=True,
+            cache_discovery=False,
+        )
+
+    def close(self):
+        with self._transcript_sessions_lock:
+            for session in self._transcript_sessions:
+                session.close()
+            self._transcript_sessions.clear()
+
+    def _get_http(self):
+        # httplib2 connections are not thread-safe; give each worker thread its own.
+        if not hasattr(self._thread_local, "http"):
+            self._thread_local.http = build_http()
+        return self._thread_local.http
+
+    def _get_transcript_client(self):
+        # YouTubeTranscriptApi is not thread-safe either; each worker thread keeps
+        # its own client over a long-lived session so connections are reused.
+        if not hasattr(self._thread_local, "transcript_client"):
+            session = Session()
+            with self._transcript_sessions_lock:
+                self._transcript_sessions.append(session)
+            self._thread_local.transcript_client = YouTubeTranscriptApi(
+                http_client=session
             )
-            items = response.get("items", [])
-            if not items:
-                logger.warning(f"Video ID {youtube_id} returned no results.")
-                return {}
-            snippet = items[0].get("snippet", {})
-            logger.info(f"Successfully fetched metadata for {youtube_id}.")
-            target_keys = ["title", "publishedAt", "description", "channelTitle"]
-            return {key: snippet.get(key) for key in target_keys if snippet.get(key)}
-        except HttpError as e:
-            logger.error(f"Google API Error for {youtube_id}: {e}")
-            return {}
-        except Exception as e:
-            logger.error(f"Unexpected error fetching metadata for {youtube_id}: {e}")
-            return {}
+        return self._thread_local.transcript_client
+
+    def get_metadata_batch(self, youtube_ids, no_cache=False):
+        metadata = {}
+        if not no_cache:
+            for youtube_id in youtube_ids:
+                cached = self.metadata_cache.get(youtube_id)
+                if cached:
+                    metadata[youtube_id] = cached
+
+        missing_ids = [
+            youtube_id for youtube_id in youtube_ids if youtube_id not in metadata
+        ]
+        for start in range(0, len(missing_ids), METADATA_BATCH_SIZE):
+            chunk = missing_ids[start : start + METADATA_BATCH_SIZE]
+            try:
+                response = (
+                    self.youtube_client.videos()
+                    .list(
+                        part="snippet",
+                        id=",".join(chunk),
+                        fields=METADATA_FIELDS,
+                    )
+                    .execute(http=self._get_http())
+                )
+            except HttpError as e:
+                logger.error("Google API Error for %s: %s", ", ".join(chunk), e)
+                continue
+            except Exception as e:
+                logger.error(
+                    "Unexpected error fetching metadata for %s: %s", ", ".join(chunk), e
+                )
+                continue
+
+            for item in response.get("items", []):
+                snippet = item.get("snippet", {})
+                metadata[item["id"]] = {
+                    key: snippet.get(key) for key in METADATA_KEYS if snippet.get(key)
+                }
+            for youtube_id in chunk:
+                if metadata.get(youtube_id):
+                    self.metadata_cache.set(youtube_id, metadata[youtube_id])
+                    logger.info("Successfully fetched metadata for %s.", youtube_id)
+                else:
+                    # Answered without an item (private or deleted); record it so
+                    # callers skip the video instead of looking it up again.
+                    metadata[youtube_id] = {}
+                    logger.warning("Video ID %s returned no results.", youtube_id)
+        return metadata
+
+    def _get_metadata(self, youtube_id, no_cache=False):
+        return self.get_metadata_batch([youtube_id], no_cache=no_cache).get(
+            youtube_id, {}
+        )
+
+    def _get_transcript(self, youtube_id, no_cache=False):
+        if not no_cache:
+            cached = self.transcript_cache.get(youtube_id)
+            if cached is not None:
+                logger.info("Using cached transcript for %s.", youtube_id)
+                return cached
 
-    def _get_transcript(self, youtube_id):
         try:
-            transcript_list = self.transcript_client.list(youtube_id)
+            transcript_list = self._get_transcript_client().list(youtube_id)
             transcript = transcript_list.find_transcript(["en", "ar"]).fetch()
-            logger.info(f"Successfully fetched transcript for {youtube_id}.")
-            return self.formatter.format_transcript(transcript).splitlines()
+            logger.info("Successfully fetched transcript for %s.", youtube_id)
+            lines = list(
+                chain.from_iterable(segment.text.splitlines() for segment in transcript)
+            )
+            self.transcript_cache.set(youtube_id, lines)
+            return lines
 
         except (TranscriptsDisabled, NoTranscriptFound):
-            logger.warning(f"Transcripts unavailable for {youtube_id}")
+            logger.warning("Transcripts unavailable for %s", youtube_id)
             return None
         except Exception as e:
-            logger.error(f"Error fetching transcript for {youtube_id}: {e}")
+            logger.error("Error fetching transcript for %s: %s", youtube_id, e)
             return None
 
-    def extract_data(self, youtube_id):
-        logger.info(f"Extracting data for: {youtube_id}...")
-        data = self._get_metadata(youtube_id)
-        if not data:
-            logger.warning(f"failed to extract data {youtube_id}")
+    def extract_data(self, youtube_id, metadata=None, no_cache=False):
+        logger.info("Extracting data for: %s...", youtube_id)
+        transcript = None
+        if metadata is None:
+            # Overlap the single-video metadata lookup with the transcript fetch.
+            executor = ThreadPoolExecutor(max_workers=1)
+            try:
+                transcript_future = executor.submit(
+                    self._get_transcript, youtube_id, no_cache
+                )
+                metadata = self._get_metadata(youtube_id, no_cache=no_cache)
+                if metadata:
+                    transcript = transcript_future.result()
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+        elif metadata:
+            transcript = self._get_transcript(youtube_id, no_cache)
+
+        if not metadata:
+            logger.warning("failed to extract data %s", youtube_id)
             return None
 
+        data = dict(metadata)
         data["url"] = f"https://www.youtube.com/watch?v={youtube_id}"
-        data["transcript"] = self._get_transcript(youtube_id)
-        logger.info(f"Successfully extracted data for {youtube_id}")
+        data["transcript"] = transcript
+        logger.info("Successfully extracted data for %s", youtube_id)
         return data